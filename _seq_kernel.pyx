@@ -0,0 +1,54 @@
+# cython: language_level=3
+#
+# SPDX-License-Identifier: GPL-3.0
+#
+"""Compiled equivalent of seq_sink_test._validate, for short runs where Numba's import and
+JIT warm-up would dominate. Build in place with:
+
+    python setup.py build_ext --inplace
+
+"""
+
+cimport cython
+from libc.stdint cimport uint64_t
+
+# Layout of sequence_comparitor._state
+cdef enum:
+    SEQ = 0
+    EXPECTED = 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def validate(const uint64_t[:, ::1] in0, uint64_t[::1] state):
+    """Single pass over in0 that counts values differing from the first value of their vector,
+    and vectors that do not follow on from the previous one. Returns (mismatches, breaks). If
+    there are no breaks, the sequence_comparitor state is advanced in place; otherwise
+    (including the startup case) it is left for check_batch().
+
+    """
+    cdef Py_ssize_t n = in0.shape[0]
+    cdef Py_ssize_t vlen = in0.shape[1]
+    cdef Py_ssize_t i, j
+    cdef Py_ssize_t mism = 0
+    cdef Py_ssize_t breaks = 0
+    cdef uint64_t v0
+    cdef uint64_t expected = state[EXPECTED]
+
+    if expected == 0:
+        breaks = 1
+
+    with nogil:
+        for i in range(n):
+            v0 = in0[i, 0]
+            for j in range(1, vlen):
+                if in0[i, j] != v0:
+                    mism += 1
+            if v0 != expected:
+                breaks += 1
+            expected = v0 + 1
+
+    if breaks == 0:
+        state[SEQ] += n
+        state[EXPECTED] = expected
+    return mism, breaks
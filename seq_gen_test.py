@@ -17,6 +17,29 @@ from argparse import ArgumentParser
 import numpy as np
 from gnuradio import blocks, gr, zeromq
 
+_U64_BYTES = np.dtype(np.uint64).itemsize
+_LOG_FMT = '%s[%d]-> (%d/s)'
+
+try:
+    from numba import njit
+except ImportError: # the NumPy broadcast fill is used instead
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _fill(out, start):
+        """Fill row i of out (2D uint64) with start + i, without holding the GIL"""
+        one = np.uint64(1)
+        n, vlen = out.shape
+        val = start
+        for i in range(n):
+            for j in range(vlen):
+                out[i, j] = val
+            val += one
+else:
+    _fill = None
+
 
 class seq_gen(gr.sync_block):
     """This class generates sequences of 'vlen' "samples". Each sample in a given vector is the
@@ -37,8 +60,55 @@ class seq_gen(gr.sync_block):
         self.start_time = time.time()
         self.update_interval = 10_000_000 # drives logging frequency
         self.rate = 0
+        self._log_every = max(self.update_interval // max(self.vlen, 1), 1)
+        self._log_countdown = self._log_every
+        self._ts_cache = ''
+        self._last_ts_sec = None
+        self._ramp_buf = np.empty(0, dtype=np.uint64) # 0, 1, 2, ...; grown lazily
+        self._scratch = np.empty(0, dtype=np.uint64)
+
+        # vlen is fixed for the life of the block, so pick the fill strategy once
+        if _fill is not None:
+            self._assign = self._assign_numba
+            _fill(np.empty((1, vlen), dtype=np.uint64), np.uint64(0)) # compile before the flowgraph starts
+        elif vlen == 1:
+            self._assign = self._assign_scalar
+        else:
+            self._assign = self._assign_vector
         self.my_log.info('Created')
 
+    @staticmethod
+    def _assign_numba(out, start):
+        _fill(out.reshape(len(out), -1), np.uint64(start))
+
+    def _ramp(self, n):
+        '''0 .. n-1 from a reused buffer, which is only reallocated when n grows'''
+        if n > self._ramp_buf.size:
+            self._ramp_buf = np.arange(n * 2, dtype=np.uint64)
+        return self._ramp_buf[:n]
+
+    def _scratch_for(self, n):
+        '''n uninitialized uint64s from a reused buffer, which is only reallocated when n grows'''
+        if n > self._scratch.size:
+            self._scratch = np.empty(n * 2, dtype=np.uint64)
+        return self._scratch[:n]
+
+    def _assign_scalar(self, out, start):
+        np.add(self._ramp(len(out)), np.uint64(start), out=out)
+
+    def _assign_vector(self, out, start):
+        n = len(out)
+        idx_vec = np.add(self._ramp(n), np.uint64(start), out=self._scratch_for(n))
+        np.copyto(out, np.broadcast_to(idx_vec[:, None], out.shape), casting='no')
+
+    def _timestamp(self):
+        '''wall-clock prefix for log lines, formatted at most once per second'''
+        now = int(time.time())
+        if now != self._last_ts_sec:
+            self._last_ts_sec = now
+            self._ts_cache = datetime.datetime.now().strftime("%H:%M:%S:")
+        return self._ts_cache
+
     def work(self, input_items, output_items):
         out = output_items[0]
 
@@ -49,23 +119,30 @@ class seq_gen(gr.sync_block):
         # Fortunately, output_items is a list of np.ndarray, and it handles assignment in a
         # mutating fashion
 
-        for idx in range(len(out)):
-            # Numpy broadcasting simplifies this a lot
-            out[idx] = np.uint64(self.index)
+        n = len(out)
 
-            self.index += 1
-            if (self.index*self.vlen) % self.update_interval == 0:
-                self.my_log.info(f'{datetime.datetime.now().strftime("%H:%M:%S:")}[{self.index}]-> ({int(self.rate)}/s)')
+        # Every vector is filled with its sequence number in a single pass. For vlen == 1
+        # GNU Radio hands us a flat array.
+        self._assign(out, self.index)
 
-        elapsed = time.time() - self.start_time
-        self.rate = self.index / elapsed
+        self.index += n
+
+        self._log_countdown -= n
+        if self._log_countdown <= 0:
+            elapsed = time.time() - self.start_time
+            self.rate = self.index / elapsed
+            self.my_log.info(_LOG_FMT % (self._timestamp(), self.index, self.rate))
+            self._log_countdown += self._log_every
+            if self._log_countdown <= 0: # one call spanned several intervals; don't carry debt
+                self._log_countdown = self._log_every
 
         return len(out)
 
 
 class seq_gen_test(gr.top_block):
 
-    def __init__(self, pub_ep='tcp://127.0.0.1:16199', vlen=1, samp_rate=8_000_000):
+    def __init__(self, pub_ep='tcp://127.0.0.1:16199', vlen=1, samp_rate=8_000_000, hwm=-1,
+                 timeout=100, output_buffer=0, no_throttle=False, socket='pub'):
         gr.top_block.__init__(self, "Sequence Generator Test", catch_exceptions=False)
 
         ##################################################
@@ -74,18 +151,38 @@ class seq_gen_test(gr.top_block):
         self.pub_ep = pub_ep
         self.vlen = vlen
         self.samp_rate = samp_rate
+        self.hwm = hwm
+        self.timeout = timeout
+        self.socket = socket
 
         ##################################################
         # Blocks
         ##################################################
         self.seq_gen = seq_gen(vlen)
-        self.throttle = blocks.throttle(np.uint64().itemsize*vlen, samp_rate/vlen,True)
-        self.pub_sink = zeromq.pub_sink(np.uint64().itemsize, vlen, pub_ep, 100, False, -1, '')
+        # Without a throttle the generator free-runs, for maximum-throughput measurement
+        self.throttle = None if no_throttle else blocks.throttle(_U64_BYTES*vlen, samp_rate/vlen,True)
+        if socket == 'push':
+            # PUSH/PULL applies back-pressure rather than dropping, at the cost of being 1-to-1
+            self.push_sink = zeromq.push_sink(_U64_BYTES, vlen, pub_ep, timeout, False, hwm)
+            zmq_sink = self.push_sink
+        else:
+            self.pub_sink = zeromq.pub_sink(_U64_BYTES, vlen, pub_ep, timeout, False, hwm, '')
+            zmq_sink = self.pub_sink
+
+        # Larger upstream buffers let the scheduler hand the ZMQ sink more items per work() call,
+        # and each call is sent as a single ZMQ message
+        if output_buffer > 0:
+            self.seq_gen.set_min_output_buffer(output_buffer)
+            if self.throttle is not None:
+                self.throttle.set_min_output_buffer(output_buffer)
 
         ##################################################
         # Connections
         ##################################################
-        self.connect(self.seq_gen, self.throttle, self.pub_sink)
+        if self.throttle is None:
+            self.connect(self.seq_gen, zmq_sink)
+        else:
+            self.connect(self.seq_gen, self.throttle, zmq_sink)
 
 
     def get_pub_ep(self):
@@ -99,14 +196,16 @@ class seq_gen_test(gr.top_block):
 
     def set_vlen(self, vlen):
         self.vlen = vlen
-        self.throttle.set_sample_rate(self.samp_rate/self.vlen)
+        if self.throttle is not None:
+            self.throttle.set_sample_rate(self.samp_rate/self.vlen)
 
     def get_samp_rate(self):
         return self.samp_rate
 
     def set_samp_rate(self, samp_rate):
         self.samp_rate = samp_rate
-        self.throttle.set_sample_rate(self.samp_rate/self.vlen)
+        if self.throttle is not None:
+            self.throttle.set_sample_rate(self.samp_rate/self.vlen)
 
 
 
@@ -121,13 +220,31 @@ def argument_parser():
     parser.add_argument(
         "--samp-rate", dest="samp_rate", type=int, default=8_000_000,
         help="Set sample rate [default=%(default)r]")
+    parser.add_argument(
+        "--no-throttle", dest="no_throttle", action="store_true",
+        help="Connect seq_gen directly to the ZMQ sink and ignore --samp-rate")
+    parser.add_argument(
+        "--socket", dest="socket", choices=['pub', 'push'], default='pub',
+        help="Set ZMQ socket type; push is lossless but 1-to-1 [default=%(default)r]")
+    parser.add_argument(
+        "--sndhwm", dest="hwm", type=int, default=-1,
+        help="Set send high-water mark; -1 keeps the ZMQ default, 0 is unbounded [default=%(default)r]")
+    parser.add_argument(
+        "--zmq-timeout", dest="timeout", type=int, default=100,
+        help="Set ZMQ send timeout in ms [default=%(default)r]")
+    parser.add_argument(
+        "--output-buffer", dest="output_buffer", type=int, default=0,
+        help="Set minimum output buffer (items) ahead of the ZMQ sink; 0 uses the scheduler default [default=%(default)r]")
     return parser
 
 
 def main(top_block_cls=seq_gen_test, options=None):
     if options is None:
         options = argument_parser().parse_args()
-    tb = top_block_cls(pub_ep=options.pub_ep, vlen=options.vlen)
+    tb = top_block_cls(pub_ep=options.pub_ep, vlen=options.vlen, samp_rate=options.samp_rate,
+                       hwm=options.hwm, timeout=options.timeout,
+                       output_buffer=options.output_buffer, no_throttle=options.no_throttle,
+                       socket=options.socket)
 
     def sig_handler(sig=None, frame=None):
         tb.stop()
@@ -15,8 +15,86 @@ import time
 from argparse import ArgumentParser
 
 import numpy as np
+from numpy import uint64 as u64
 from gnuradio import blocks, gr, zeromq
 
+_U64_BYTES = np.dtype(np.uint64).itemsize
+_LOG_FMT = '%s[%d]<-%d (%d/s) (len(in0)=%d)'
+_TILE_ITEMS = 4096 // _U64_BYTES # NumPy fallback compares 4 KiB of input (plus a 512 B mask) at a time
+
+# Layout of sequence_comparitor._state
+_SEQ, _EXPECTED, _DROPPED, _FIRST_SEEN = range(4)
+
+# uint64 arithmetic with a plain int promotes to float64 in NumPy < 2, so use this instead
+_ONE = u64(1)
+
+# Kernel preference: the compiled extension (no JIT warm-up), then Numba, then NumPy
+try:
+    from _seq_kernel import validate as _validate # python setup.py build_ext --inplace
+except ImportError:
+    _validate = None
+
+try:
+    from numba import njit
+except ImportError: # the vectorized NumPy path is used instead
+    njit = None
+
+
+if _validate is None and njit is not None:
+    @njit(cache=True, nogil=True, boundscheck=False)
+    def _validate(in0, state):
+        """Single pass over in0 (2D uint64) that counts values differing from the first value of
+        their vector, and vectors that do not follow on from the previous one. Returns
+        (mismatches, breaks). If there are no breaks, the sequence_comparitor state is advanced
+        in place; otherwise (including the startup case) it is left for check_batch().
+
+        """
+        one = np.uint64(1)
+        n, vlen = in0.shape
+        expected = state[_EXPECTED]
+        mism = 0
+        breaks = 0 if expected != 0 else 1
+        for i in range(n):
+            v0 = in0[i, 0]
+            for j in range(1, vlen):
+                if in0[i, j] != v0:
+                    mism += 1
+            if v0 != expected:
+                breaks += 1
+            expected = v0 + one
+        if breaks == 0:
+            state[_SEQ] += np.uint64(n)
+            state[_EXPECTED] = expected
+        return mism, breaks
+
+
+def _count_mismatches(rows):
+    """Count values in rows (2D uint64) differing from the first value of their vector. Rows are
+    compared a tile at a time into one reused mask, so no full-size temporaries are created.
+
+    """
+    n, vlen = rows.shape
+    step = max(_TILE_ITEMS // vlen, 1)
+    mask = np.empty((min(step, n), vlen), dtype=bool)
+    bad = 0
+    for start in range(0, n, step):
+        tile = rows[start:start + step]
+        m = mask[:len(tile)]
+        np.not_equal(tile, tile[:, :1], out=m)
+        bad += int(np.count_nonzero(m))
+    return bad
+
+
+def _state_field(index):
+    '''property exposing one element of sequence_comparitor._state as a np.uint64'''
+    def getter(self):
+        return self._state[index]
+
+    def setter(self, value):
+        self._state[index] = value
+
+    return property(getter, setter)
+
 
 class sequence_comparitor:
     """This is a reusable class that compares a value to an expected value, and complains about
@@ -25,24 +103,38 @@ class sequence_comparitor:
        'max_err' occurrences, the process terminates.
 
     """
+    __slots__ = ('_state', 'start_time', 'max_err', 'logger', '_expected_buf', '_breaks_buf')
+
+    # The counters live in one uint64 array so the Numba kernel can update them in place.
+    # Each access through these properties is a Python call plus a numpy scalar, which is
+    # only acceptable because the kernel path reads and writes _state directly; the
+    # properties are used on the NumPy fallback and at discontinuities.
+    seq = _state_field(_SEQ)
+    expected = _state_field(_EXPECTED)
+    dropped_count = _state_field(_DROPPED)
+    first_seen = _state_field(_FIRST_SEEN)
 
     def __init__(self, logger, **kw):
-        self.seq = 0
+        self._state = np.zeros(4, dtype=np.uint64)
         self.logger = logger
-        self.init_metrics(0)
+        self.init_metrics(u64(0))
 
-        self.dropped_count = 0
+        self.dropped_count = u64(0)
         self.max_err = kw.get('max_err', 10)
 
+        # check_batch() temporaries, grown lazily and reused across calls
+        self._expected_buf = np.empty(0, dtype=np.uint64)
+        self._breaks_buf = np.empty(0, dtype=bool)
+
     def init_metrics(self, start):
         self.first_seen = start
         self.expected = start;
         self.start_time = time.time()
 
     def check(self, idx):
-        self.seq += 1
+        self.seq += _ONE
 
-        actual = idx
+        actual = u64(idx)
 
 #        self.logger.info(f'[{self.seq}]: {actual=}, expected={self.expected}')
         if self.expected == 0:
@@ -54,12 +146,40 @@ class sequence_comparitor:
 
         elif (actual > self.expected):
             self.logger.error(f'[{self.seq}]: dropped {actual-self.expected} Expected: {self.expected}, actual {actual}')
-            self.dropped_count += 1
+            self.dropped_count += _ONE
 
         if self.dropped_count > self.max_err:
             raise SystemExit(0)
 
-        self.expected = actual + 1
+        self.expected = actual + _ONE
+
+    def check_batch(self, values):
+        '''Equivalent to calling check() on each of values, but only the discontinuities are
+        visited in Python'''
+        n = len(values)
+        if n == 0:
+            return
+
+        if n > self._expected_buf.size:
+            self._expected_buf = np.empty(n * 2, dtype=np.uint64)
+            self._breaks_buf = np.empty(n * 2, dtype=bool)
+
+        seq, start = self.seq, self.expected
+        expected = self._expected_buf[:n]
+        expected[0] = start
+        np.add(values[:-1], _ONE, out=expected[1:])
+
+        breaks = np.not_equal(values, expected, out=self._breaks_buf[:n])
+        if start == 0:
+            breaks[0] = True # let check() handle the startup case
+
+        for idx in np.flatnonzero(breaks):
+            self.seq = seq + u64(idx)
+            self.expected = expected[idx]
+            self.check(values[idx])
+
+        self.seq = seq + u64(n)
+        self.expected = values[-1] + _ONE
 
     def rate(self):
         '''compute the observed data rate'''
@@ -72,7 +192,7 @@ class seq_sink(gr.sync_block):
     """
     docstring for block seq_sink
     """
-    def __init__(self, vlen=1):
+    def __init__(self, vlen=1, check_mode='full'):
         gr.sync_block.__init__(self,
             name="seq_sink",
             in_sig=[(np.uint64, vlen)],
@@ -81,33 +201,91 @@ class seq_sink(gr.sync_block):
         self.vlen       = vlen
         self.calls_to_work = 0
         self.update_interval = 10_000_000
+        self._log_every = max(self.update_interval // max(self.vlen, 1), 1)
+        self._log_countdown = self._log_every
+        self._ts_cache = ''
+        self._last_ts_sec = None
         self.my_log     = gr.logger(self.alias())
         self.tester     = sequence_comparitor(self.my_log)
 
+        # vlen is fixed for the life of the block; scalars have no intra-vector consistency
+        # to check, and 'first-only' skips that check to touch only the first column
+        if vlen == 1 or check_mode == 'first-only':
+            self.work = self._work_first_only
+        elif _validate is not None:
+            # Compile now rather than in the first work() call, where the stall would show
+            # up as dropped data while the publisher keeps sending
+            _validate(np.zeros((1, vlen), dtype=np.uint64), np.zeros(4, dtype=np.uint64))
+
     def work(self, input_items, output_items):
-        self.calls_to_work += 1
+        tester = self.tester
+        calls_to_work = self.calls_to_work = self.calls_to_work + 1
+
+        # The kernels are written for C-contiguous uint64 rows (uint64_t[:, ::1]). GNU Radio's
+        # buffers already are, so the copy is a safety net that should never run.
         in0 = input_items[0]
+        assert in0.dtype == np.uint64
+        if not in0.flags.c_contiguous:
+            in0 = np.ascontiguousarray(in0)
+
+        n = len(in0)
+        if n == 0:
+            return 0
+
+        col0 = in0[:, 0]
+        if _validate is not None:
+            bad, breaks = _validate(in0, tester._state)
+        else:
+            bad = _count_mismatches(in0)
+
+        if bad > 0:
+            # This has never been seen
+            self.my_log.error(f'Data corruption: {bad} unexpected values ({in0.size - bad} consistent values)')
+
+        # Check the received values vs expected
+        if _validate is None or breaks > 0:
+            tester.check_batch(col0)
+
+        self._log_countdown -= n
+        if self._log_countdown <= 0:
+            self._log_progress(calls_to_work, n)
+        return len(in0)
 
-        for idx in range(len(in0)):
-            if (self.tester.seq * self.vlen) % self.update_interval == 0:
-                self.my_log.info(f'{datetime.datetime.now().strftime("%H:%M:%S:")}[{self.calls_to_work}]<-{self.tester.expected} ({int(self.tester.rate())}/s) ({len(in0)=})')
+    def _work_first_only(self, input_items, output_items):
+        calls_to_work = self.calls_to_work = self.calls_to_work + 1
+        in0 = input_items[0]
 
-            v = in0[idx]
-            actual = v[0] if (self.vlen) > 1 else v # vector or scalar, depending on vlen size
-            good = v[v == actual]                   # np.array of bool where the value matches the first value
-            bad = v[v != actual]                    # np.array of bool where the value does not match the first value
-            if bad.size > 0:
-                # This has never been seen
-                self.my_log.error(f'Data corruption: {bad.size} unexpected values ({good.size} consistent values)')
+        n = len(in0)
+        if n == 0:
+            return 0
 
-            # Check the received value vs expected
-            self.tester.check(actual) 
+        # Check the received values vs expected
+        self.tester.check_batch(in0 if self.vlen == 1 else in0[:, 0])
 
+        self._log_countdown -= n
+        if self._log_countdown <= 0:
+            self._log_progress(calls_to_work, n)
         return len(in0)
 
+    def _timestamp(self):
+        '''wall-clock prefix for log lines, formatted at most once per second'''
+        now = int(time.time())
+        if now != self._last_ts_sec:
+            self._last_ts_sec = now
+            self._ts_cache = datetime.datetime.now().strftime("%H:%M:%S:")
+        return self._ts_cache
+
+    def _log_progress(self, calls_to_work, n):
+        tester = self.tester
+        self.my_log.info(_LOG_FMT % (self._timestamp(), calls_to_work, tester.expected, tester.rate(), n))
+        self._log_countdown += self._log_every
+        if self._log_countdown <= 0: # one call spanned several intervals; don't carry debt
+            self._log_countdown = self._log_every
+
 class seq_gen_test(gr.top_block):
 
-    def __init__(self, pub_ep='tcp://127.0.0.1:16199', vlen=1, hwm=-1):
+    def __init__(self, pub_ep='tcp://127.0.0.1:16199', vlen=1, hwm=-1, timeout=100, socket='sub',
+                 check_mode='full'):
         gr.top_block.__init__(self, "Sequence Generator Test", catch_exceptions=True)
 
         ##################################################
@@ -115,19 +293,28 @@ class seq_gen_test(gr.top_block):
         ##################################################
         self.pub_ep = pub_ep
         self.vlen = vlen
+        self.hwm = hwm
+        self.timeout = timeout
+        self.socket = socket
+        self.check_mode = check_mode
         pass_tags = False
 
         ##################################################
         # Blocks
         ##################################################
-        self.sub_source = zeromq.sub_source(np.uint64().itemsize, vlen, pub_ep, 100, pass_tags, hwm, '')
-        self.seq_sink = seq_sink(vlen=vlen)
+        if socket == 'pull':
+            self.pull_source = zeromq.pull_source(_U64_BYTES, vlen, pub_ep, timeout, pass_tags, hwm)
+            zmq_source = self.pull_source
+        else:
+            self.sub_source = zeromq.sub_source(_U64_BYTES, vlen, pub_ep, timeout, pass_tags, hwm, '')
+            zmq_source = self.sub_source
+        self.seq_sink = seq_sink(vlen=vlen, check_mode=check_mode)
 
 
         ##################################################
         # Connections
         ##################################################
-        self.connect(self.sub_source, self.seq_sink)
+        self.connect(zmq_source, self.seq_sink)
 
 
     def get_pub_ep(self):
@@ -153,15 +340,26 @@ def argument_parser():
         "--vlen", dest="vlen", type=int, default=1,
         help="Set vlen [default=%(default)r]")
     parser.add_argument(
-        "--hwm", dest="hwm", type=int, default=-1,
-        help="Set high-water mark [default=%(default)r]")
+        "--socket", dest="socket", choices=['sub', 'pull'], default='sub',
+        help="Set ZMQ socket type; pull pairs with the generator's push [default=%(default)r]")
+    parser.add_argument(
+        "--hwm", "--rcvhwm", dest="hwm", type=int, default=-1,
+        help="Set receive high-water mark; -1 keeps the ZMQ default, 0 is unbounded [default=%(default)r]")
+    parser.add_argument(
+        "--zmq-timeout", dest="timeout", type=int, default=100,
+        help="Set ZMQ receive timeout in ms [default=%(default)r]")
+    parser.add_argument(
+        "--check-mode", dest="check_mode", choices=['full', 'first-only'], default='full',
+        help="Set validation; first-only checks the sequence without scanning whole vectors [default=%(default)r]")
     return parser
 
 
 def main(top_block_cls=seq_gen_test, options=None):
     if options is None:
         options = argument_parser().parse_args()
-    tb = top_block_cls(pub_ep=options.pub_ep, vlen=options.vlen)
+    tb = top_block_cls(pub_ep=options.pub_ep, vlen=options.vlen, hwm=options.hwm,
+                       timeout=options.timeout, socket=options.socket,
+                       check_mode=options.check_mode)
 
     def sig_handler(sig=None, frame=None):
         tb.stop()
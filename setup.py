@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+#
+# SPDX-License-Identifier: GPL-3.0
+#
+# Builds the optional seq_sink validation kernel:
+#   python setup.py build_ext --inplace
+
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+setup(
+    name="seq_kernel",
+    ext_modules=cythonize(
+        Extension("_seq_kernel", ["_seq_kernel.pyx"],
+                  extra_compile_args=["-O3", "-march=native"])),
+)